@@ -5,3 +5,10 @@ AZURE_CLIENT_SECRET = env("AZURE_CLIENT_SECRET")
 AZURE_TENANT_ID = env("AZURE_TENANT_ID")
 AZURE_SUBSCRIPTION_ID = env("AZURE_SUBSCRIPTION_ID")
 AZURE_VAULT_URL = env("AZURE_VAULT_URL")
+
+# Max in-flight Cost Management requests per pull_concurrently fan-out
+AZURE_CM_BULKHEAD = env.int("AZURE_CM_BULKHEAD", default=16)
+
+# Rows per INSERT when Services data is saved with bulk_create, PostgreSQL
+# stops getting faster somewhere between 1k and 10k rows.
+SERVICES_BULK_BATCH_SIZE = env.int("SERVICES_BULK_BATCH_SIZE", default=2000)
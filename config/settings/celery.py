@@ -1,17 +1,16 @@
 from __future__ import absolute_import, unicode_literals
 
-from celery import Celery
-from config.env import env
-
-
 import os
 
 from celery import Celery
+from kombu import Exchange, Queue
 
 from config.env import BASE_DIR, env
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.django.local")
-env.read_env(os.path.join(BASE_DIR, ".env"))
+# config.django.base already loaded .env when Django settings import us.
+if "CELERY_BROKER_URL" not in os.environ:
+    env.read_env(os.path.join(BASE_DIR, ".env"))
 
 
 app = Celery("config")
@@ -19,40 +18,68 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
 
 
-CELERY_BROKER_URL = env("CELERY_BROKER_URL")
-CELERY_RESULT_BACKEND = env("CELERY_RESULT_BACKEND")
-CELERY_ACCEPT_CONTENT = ["json"]
-CELERY_TASK_SERIALIZER = "json"
-CELERY_RESULT_SERIALIZER = "json"
-CELERY_TIMEZONE = env("TIME_ZONE", default="UTC")
-
-CELERY_TASK_TRACK_STARTED = True
-CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
-CELERY_TASK_SOFT_TIME_LIMIT = 25 * 60  # 25 minutes
-CELERY_WORKER_MAX_TASKS_PER_CHILD = 128
-CELERY_WORKER_PREFETCH_MULTIPLIER = 4
-
 # Broker settings
 CELERY_BROKER_URL = env("CELERY_BROKER_URL")
 CELERY_RESULT_BACKEND = env("CELERY_RESULT_BACKEND")
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True  # New setting for Celery 6.0+
+CELERY_BROKER_POOL_LIMIT = env.int("CELERY_BROKER_POOL_LIMIT", default=50)
+CELERY_BROKER_HEARTBEAT = 30
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    # AMQP (py-amqp) only, ignored by the Redis broker of the compose stack.
+    # There a failed publish is covered by the publish retry policy below.
+    "confirm_publish": True,
+    "socket_timeout": 5,
+}
+CELERY_TASK_PUBLISH_RETRY = True
+CELERY_TASK_PUBLISH_RETRY_POLICY = {
+    "max_retries": 3,
+    "interval_start": 0,
+    "interval_step": 0.2,
+    "interval_max": 1,
+}
 
 # Serialization
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
+CELERY_TASK_COMPRESSION = "gzip"
+CELERY_RESULT_COMPRESSION = "gzip"
 
 # Time and timezone
 CELERY_TIMEZONE = env("TIME_ZONE", default="UTC")
 
 # Task settings
 CELERY_TASK_TRACK_STARTED = True
-CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
-CELERY_TASK_SOFT_TIME_LIMIT = 25 * 60  # 25 minutes
+# Defaults for short tasks, long running tasks set their own limits
+CELERY_TASK_TIME_LIMIT = 5 * 60  # 5 minutes
+CELERY_TASK_SOFT_TIME_LIMIT = 4 * 60  # 4 minutes
+CELERY_TASK_ACKS_LATE = True  # Ack after the task finishes, not on receive
+CELERY_TASK_REJECT_ON_WORKER_LOST = True  # Requeue if the worker dies mid-task
+CELERY_TASK_ACKS_ON_FAILURE_OR_TIMEOUT = False  # Reject instead of ack on failure
+
+# Queue settings
+# Each workload gets its own queue so long running Azure pulls never sit in
+# front of short tasks prefetched by the same worker. Start one worker per
+# queue, e.g. `celery -A config.settings worker -Q ingest --prefetch-multiplier 4`.
+CELERY_TASK_DEFAULT_QUEUE = "default"
+CELERY_TASK_QUEUES = (
+    Queue("priority", Exchange("priority"), routing_key="priority"),
+    Queue("ingest", Exchange("ingest"), routing_key="ingest"),
+    Queue("default", Exchange("default"), routing_key="default"),
+)
+CELERY_TASK_ROUTES = {
+    "nilakandi.tasks.grab_services": {"queue": "ingest", "routing_key": "ingest"},
+    "nilakandi.tasks.grab_marketplaces": {"queue": "ingest", "routing_key": "ingest"},
+}
 
 # Worker settings
 CELERY_WORKER_MAX_TASKS_PER_CHILD = 128
-CELERY_WORKER_PREFETCH_MULTIPLIER = 4
+CELERY_WORKER_LOST_WAIT = 60
+# Prefetch is tuned per queue on the worker command line (--prefetch-multiplier),
+# this is only the fallback for workers started without it.
+CELERY_WORKER_PREFETCH_MULTIPLIER = env.int(
+    "CELERY_WORKER_PREFETCH_MULTIPLIER", default=1
+)
 
 # Result settings
-CELERY_RESULT_EXPIRES = 60 * 60 * 24  # Results expire after 1 day
\ No newline at end of file
+CELERY_RESULT_EXPIRES = 60 * 60 * 24  # Results expire after 1 day
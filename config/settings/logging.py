@@ -37,17 +37,29 @@ LOGGING = {
             "class": "logging.StreamHandler",
             "formatter": "simple",
         },
+        # Loggers only enqueue records; the file and console handlers run on
+        # the QueueListener thread started in NilakandiConfig.ready().
+        "queue": {
+            "class": "logging.handlers.QueueHandler",
+            "handlers": ["file", "console"],
+            "respect_handler_level": True,
+        },
     },
     "loggers": {
         "django": {
-            "handlers": ["file", "console"],
+            "handlers": ["queue"],
             "level": "INFO",
             "propagate": True,
         },
         "django.db": {
-            "handlers": ["file", "console"],
+            "handlers": ["queue"],
             "level": "INFO",
             "propagate": False
-        }
+        },
+        "nilakandi": {
+            "handlers": ["queue"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
 }
@@ -1,3 +1,7 @@
+import atexit
+import logging
+import os
+
 from django.apps import AppConfig
 
 
@@ -7,3 +11,26 @@ class NilakandiConfig(AppConfig):
 
     def ready(self):
         import nilakandi.signals
+
+        self.start_log_listener()
+
+    @staticmethod
+    def start_log_listener() -> None:
+        """Start the QueueListener that drains the "queue" logging handler.
+
+        The listener thread does not survive a fork, so it is stopped before
+        forking, which drains the queue so no record reaches both processes,
+        and restarted in the parent and in every child (e.g. Celery prefork
+        workers).
+        """
+        handler = logging.getHandlerByName("queue")
+        listener = getattr(handler, "listener", None)
+        if listener is None:
+            return
+        listener.start()
+        atexit.register(listener.stop)
+        os.register_at_fork(
+            before=listener.stop,
+            after_in_parent=listener.start,
+            after_in_child=listener.start,
+        )
@@ -1,19 +1,142 @@
+import asyncio
+from datetime import date
 from datetime import datetime as dt
 from datetime import timedelta
-from re import sub
+from operator import itemgetter
+from typing import Iterator
+from urllib.parse import urlsplit
 from uuid import UUID
 from zoneinfo import ZoneInfo as zi
 
-import pandas as pd
-from requests import exceptions, post
-from tenacity import retry, retry_if_exception, stop_after_attempt
+import aiohttp
+import orjson
+from pybreaker import CircuitBreaker
+from requests import Response, Session, exceptions
+from requests.adapters import HTTPAdapter
+from tenacity import (
+    retry,
+    retry_if_exception,
+    retry_if_exception_type,
+    stop_after_attempt,
+)
 
-from config.django.base import TIME_ZONE
+from config.django.base import AZURE_CM_BULKHEAD, TIME_ZONE
 from nilakandi.azure.models import ApiResult
-from nilakandi.helper.miscellaneous import wait_retry_after
+from nilakandi.helper.bulk_copy import copy_insert
+from nilakandi.helper.miscellaneous import (
+    get_subscription,
+    snake_case,
+    wait_retry_after,
+)
 from nilakandi.models import Services as ServicesModel
 from nilakandi.models import Subscription as SubscriptionsModel
 
+# One keep-alive connection pool per process, so pagination and retries
+# against management.azure.com skip the TCP and TLS handshake.
+SESSION = Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=64))
+
+# Seconds, a stalled connection must not hang the worker until the task limit.
+CONNECT_TIMEOUT, READ_TIMEOUT = 5, 60
+
+# Query dataset shared by every Services payload, only the time period varies.
+DATASET: dict[str, str | dict | list] = {
+    "granularity": "Daily",
+    "aggregation": {"totalCost": {"name": "CostUSD", "function": "Sum"}},
+    "grouping": [
+        {"type": "Dimension", "name": "SubscriptionId"},
+        {"type": "Dimension", "name": "ChargeType"},
+        {"type": "Dimension", "name": "ServiceName"},
+        {"type": "Dimension", "name": "ServiceTier"},
+        {"type": "Dimension", "name": "Meter"},
+        {"type": "Dimension", "name": "PartNumber"},
+        {"type": "Dimension", "name": "BillingMonth"},
+        {"type": "Dimension", "name": "ResourceId"},
+        {"type": "Dimension", "name": "ResourceType"},
+    ],
+}
+
+# Columns read into ServicesModel, in the order _iter_models unpacks them.
+SERVICE_FIELDS: tuple[str, ...] = (
+    "usage_date",
+    "charge_type",
+    "service_name",
+    "service_tier",
+    "meter",
+    "part_number",
+    "billing_month",
+    "resource_id",
+    "resource_type",
+    "cost_usd",
+    "currency",
+)
+
+# One breaker per host, so an outage of one endpoint does not trip the others.
+BREAKERS: dict[str, CircuitBreaker] = {}
+
+
+def is_client_error(e: BaseException) -> bool:
+    """Whether the exception is a 4xx response, which says nothing about Azure being down.
+
+    Args:
+        e (BaseException): Exception raised inside the breaker, by requests or aiohttp.
+
+    Returns:
+        bool: True if the breaker should not count it as a failure.
+    """
+    if isinstance(e, exceptions.HTTPError):
+        return 400 <= e.response.status_code < 500
+    if isinstance(e, aiohttp.ClientResponseError):
+        return 400 <= e.status < 500
+    return False
+
+
+def breaker_for(url: str) -> CircuitBreaker:
+    """Circuit breaker of the host the url points to.
+    Opens after 10 consecutive failures and lets a trial call through after 30 seconds.
+
+    Args:
+        url (str): Request URL.
+
+    Returns:
+        CircuitBreaker: Breaker shared by every call to that host.
+    """
+    host = urlsplit(url).netloc
+    if host not in BREAKERS:
+        BREAKERS[host] = CircuitBreaker(
+            fail_max=10, reset_timeout=30, exclude=[is_client_error], name=host
+        )
+    return BREAKERS[host]
+
+
+def is_throttled(e: BaseException) -> bool:
+    """Whether the exception is a 429 response from either HTTP client.
+
+    Args:
+        e (BaseException): Exception raised by requests or aiohttp.
+
+    Returns:
+        bool: True if Azure asked us to slow down.
+    """
+    if isinstance(e, exceptions.HTTPError):
+        return e.response.status_code == 429
+    if isinstance(e, aiohttp.ClientResponseError):
+        return e.status == 429
+    return False
+
+
+def to_timestamp(date: dt) -> str:
+    """Format a datetime the way the Cost Management API expects it.
+    Same output as strftime("%Y-%m-%dT%H:%M:%S.%fZ"), without the format parsing.
+
+    Args:
+        date (dt): Datetime to format, tzinfo is dropped as strftime did.
+
+    Returns:
+        str: e.g. "2025-01-31T23:59:59.999999Z".
+    """
+    return date.replace(tzinfo=None).isoformat(timespec="microseconds") + "Z"
+
 
 class Services:
     """Services class to pull data from Azure API and save it to the database."""
@@ -23,7 +146,7 @@ class Services:
         bearer_token: str,
         subscription: SubscriptionsModel | UUID,
         base_url: str = "https://management.azure.com",
-        end_date: dt = dt.now(tz=zi(TIME_ZONE)),
+        end_date: dt | None = None,
         start_date: dt | None = None,
     ):
         """Initialize the Services class.
@@ -32,13 +155,16 @@ class Services:
             bearer_token (str): berarer token for the Azure API. <JWT>
             subscription (SubscriptionsModel | UUID): Subscription model or UUID of the subscription.
             base_url (str, optional): The URL of main request. Defaults to "https://management.azure.com".
-            end_date (dt, optional): End date of data gathered. Defaults to dt.now(tz=zi(TIME_ZONE)).
-            start_date (dt | None, optional): Start date of data gathered. Defaults to None.
+            end_date (dt | None, optional): End date of data gathered. Defaults to now, in TIME_ZONE.
+            start_date (dt | None, optional): Start date of data gathered. Defaults to 30 days before end_date.
 
         Raises:
             ValueError: Date deltas must be within 1 year.
             ValueError: start_date must be less than end_date.
         """
+        # Resolved per call, a default argument would freeze the import time.
+        end_date = end_date if end_date else dt.now(tz=zi(TIME_ZONE))
+        start_date = start_date if start_date else end_date - timedelta(days=30)
         if end_date - start_date > timedelta(days=365):
             raise ValueError("Date range must be within 1 year")
         if end_date < start_date:
@@ -47,13 +173,11 @@ class Services:
         self.subscription: SubscriptionsModel = (
             subscription
             if isinstance(subscription, SubscriptionsModel)
-            else SubscriptionsModel.objects.get(subscription_id=subscription)
+            else get_subscription(subscription_id=subscription)
         )
         self.end_date: dt = end_date
         self.res = None
-        self.start_date: dt = (
-            start_date if start_date else end_date - timedelta(days=30)
-        )
+        self.start_date: dt = start_date
         self.uri: str = (
             f"{base_url}{self.subscription.id}/providers/Microsoft.CostManagement/query"
         )
@@ -72,33 +196,41 @@ class Services:
             "type": "ActualCost",
             "timeframe": "Custom",
             "timePeriod": {
-                "from": self.start_date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
-                "to": self.end_date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
-            },
-            "dataset": {
-                "granularity": "Daily",
-                "aggregation": {"totalCost": {"name": "CostUSD", "function": "Sum"}},
-                "grouping": [
-                    {"type": "Dimension", "name": "SubscriptionId"},
-                    {"type": "Dimension", "name": "ChargeType"},
-                    {"type": "Dimension", "name": "ServiceName"},
-                    {"type": "Dimension", "name": "ServiceTier"},
-                    {"type": "Dimension", "name": "Meter"},
-                    {"type": "Dimension", "name": "PartNumber"},
-                    {"type": "Dimension", "name": "BillingMonth"},
-                    {"type": "Dimension", "name": "ResourceId"},
-                    {"type": "Dimension", "name": "ResourceType"},
-                ],
+                "from": to_timestamp(self.start_date),
+                "to": to_timestamp(self.end_date),
             },
+            "dataset": DATASET,
         }
+        # Serialized once, every page and retry sends the same body.
+        self.payload_bytes: bytes = orjson.dumps(self.payload)
+
+    def _post(self, url: str, params: dict[str, str] | None) -> Response:
+        """Send the query, raising for any non 2xx status.
+
+        Args:
+            url (str): URL to send the query to.
+            params (dict[str, str] | None): Query string parameters.
+
+        Returns:
+            Response: The successful response.
+        """
+        reqRes = SESSION.post(
+            url=url,
+            params=params,
+            headers=self.headers,
+            data=self.payload_bytes,
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+        )
+        reqRes.raise_for_status()
+        return reqRes
 
     @retry(
-        stop=stop_after_attempt(5),
+        stop=stop_after_attempt(8),
         reraise=True,
         wait=wait_retry_after,
-        retry=retry_if_exception(
-            lambda e: isinstance(e, exceptions.HTTPError)
-            and e.response.status_code == 429
+        retry=(
+            retry_if_exception(is_throttled)
+            | retry_if_exception_type((exceptions.Timeout, TimeoutError))
         ),
     )
     def pull(self, uri: str | None = None) -> "Services":
@@ -110,65 +242,202 @@ class Services:
         Returns:
             Services: Services class object.
         """
-        reqRes = post(
-            url=self.uri if (uri is None) else uri,
-            params=self.params if (uri is None) else None,
-            headers=self.headers,
-            json=self.payload,
+        url = self.uri if (uri is None) else uri
+        # Raises CircuitBreakerError while the host is down, which is not retried.
+        reqRes = breaker_for(url).call(
+            self._post, url=url, params=self.params if (uri is None) else None
         )
-        reqRes.raise_for_status()
-        res = reqRes.json().copy()
-        columns = [
-            sub(
-                r"(?<=[a-z])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])",
-                "_",
-                col["name"],
-            ).lower()
-            for col in res["properties"]["columns"]
-        ]
-        rows = [dict(zip(columns, row)) for row in res["properties"]["rows"]]
-
-        self.res: ApiResult = ApiResult(
+        self.res = self._to_result(
             status=reqRes.status_code,
             headers=reqRes.headers,
-            data=pd.DataFrame(data=rows),
+            res=orjson.loads(reqRes.content),
+        )
+        return self
+
+    @retry(
+        stop=stop_after_attempt(8),
+        reraise=True,
+        wait=wait_retry_after,
+        retry=(
+            retry_if_exception(is_throttled)
+            | retry_if_exception_type((exceptions.Timeout, TimeoutError))
+        ),
+    )
+    async def async_pull(
+        self, session: aiohttp.ClientSession, uri: str | None = None
+    ) -> "Services":
+        """Async counterpart of `pull`, so many pulls can share one event loop.
+
+        Args:
+            session (aiohttp.ClientSession): Session to send the request with, see `pull_concurrently`.
+            uri (str | None, optional): URL, If provided will replace the class declared uri. Defaults to None.
+
+        Returns:
+            Services: Services class object.
+        """
+        url = self.uri if (uri is None) else uri
+        # Same breaker as `pull`, so both paths see when the host is down.
+        with breaker_for(url).calling():
+            async with session.post(
+                url=url,
+                params=self.params if (uri is None) else None,
+                headers=self.headers,
+                data=self.payload_bytes,
+            ) as reqRes:
+                reqRes.raise_for_status()
+                res = orjson.loads(await reqRes.read())
+        self.res = self._to_result(
+            status=reqRes.status, headers=dict(reqRes.headers), res=res
+        )
+        return self
+
+    async def async_pull_all(self, session: aiohttp.ClientSession) -> "Services":
+        """Pull every page by following nextLink, collecting the rows into one result.
+
+        Args:
+            session (aiohttp.ClientSession): Session to send the requests with.
+
+        Returns:
+            Services: Services class object, self.res holds the rows of all pages.
+        """
+        first: ApiResult = (await self.async_pull(session=session)).res
+        while self.res.next_link:
+            await self.async_pull(session=session, uri=self.res.next_link)
+            first.raw.extend(self.res.raw)
+        first.next_link = None
+        self.res = first
+        return self
+
+    def _to_result(self, status: int, headers: dict, res: dict) -> ApiResult:
+        """Turn a decoded Cost Management query response into an ApiResult.
+
+        Args:
+            status (int): HTTP status code of the response.
+            headers (dict): Response headers.
+            res (dict): Decoded JSON body.
+
+        Returns:
+            ApiResult: Parsed result.
+        """
+        columns = [snake_case(col["name"]) for col in res["properties"]["columns"]]
+
+        return ApiResult(
+            status=status,
+            headers=headers,
             next_link=res.get("properties").get("nextLink"),
-            raw=rows,
+            # Rows stay positional, a dict per row is only overhead.
+            raw=res["properties"]["rows"],
+            columns=columns,
             meta={
                 key: value
                 for key, value in res.items()
                 if key not in ["columns", "rows", "properties"]
             },
         )
-        return self
 
-    def db_save(self) -> "Services":
+    def _iter_models(self, res: ApiResult) -> Iterator[ServicesModel]:
+        """Yield one unsaved ServicesModel per row of the result.
+
+        Args:
+            res (ApiResult): Result to convert.
+
+        Yields:
+            Iterator[ServicesModel]: Model instances, built lazily.
+        """
+        # Row values in SERVICE_FIELDS order, fetched with one C call per row.
+        get_service_fields = itemgetter(*map(res.columns.index, SERVICE_FIELDS))
+        usage_at = res.columns.index("usage_date")
+        billing_at = res.columns.index("billing_month")
+        # A page only spans a handful of distinct days and months, parse each once.
+        # UsageDate is an int like 20240315, BillingMonth "2024-03-01T00:00:00".
+        usage_dates = {
+            value: date(value // 10000, value // 100 % 100, value % 100)
+            for value in {int(row[usage_at]) for row in res.raw}
+        }
+        billing_months = {
+            value: date(int(value[:4]), int(value[5:7]), int(value[8:10]))
+            for value in {row[billing_at] for row in res.raw}
+        }
+        for row in res.raw:
+            (
+                usage_date,
+                charge_type,
+                service_name,
+                service_tier,
+                meter,
+                part_number,
+                billing_month,
+                resource_id,
+                resource_type,
+                cost_usd,
+                currency,
+            ) = get_service_fields(row)
+            yield ServicesModel(
+                subscription=self.subscription,
+                usage_date=usage_dates[int(usage_date)],
+                charge_type=charge_type,
+                service_name=service_name,
+                service_tier=service_tier,
+                meter=meter,
+                part_number=part_number,
+                billing_month=billing_months[billing_month],
+                resource_id=resource_id or "",
+                resource_type=resource_type or "",
+                cost_usd=cost_usd,
+                currency=currency,
+            )
+
+    def db_save(self, res: ApiResult | None = None) -> "Services":
         """Save gathered data to DB
 
+        Args:
+            res (ApiResult | None, optional): Result to save, lets a caller save a page while the next one is pulled. Defaults to the last pulled result.
+
         Raises:
             ValueError: Response data is not available or result is empty.
 
         Returns:
             Services: Services class object.
         """
-        if not isinstance(self.res, ApiResult):
+        res = self.res if (res is None) else res
+        if not isinstance(res, ApiResult):
             raise ValueError("No data to save")
-        data: list[ServicesModel] = [
-            ServicesModel(
-                subscription=self.subscription,
-                usage_date=dt.strptime(str(row["usage_date"]), "%Y%m%d"),
-                charge_type=row["charge_type"],
-                service_name=row["service_name"],
-                service_tier=row["service_tier"],
-                meter=row["meter"],
-                part_number=row["part_number"],
-                billing_month=dt.fromisoformat(row["billing_month"]).date(),
-                resource_id=row["resource_id"],
-                resource_type=row["resource_type"],
-                cost_usd=row["cost_usd"],
-                currency=row["currency"],
-            )
-            for index, row in self.res.data.iterrows()
-        ]
-        ServicesModel.objects.bulk_create(data, batch_size=500)
+        # Instances are streamed straight into one COPY, never held as a list.
+        copy_insert(ServicesModel, self._iter_models(res=res), ignore_conflicts=True)
         return self
+
+
+def pull_concurrently(
+    services: list[Services], all_pages: bool = False
+) -> list[Services]:
+    """Pull many Services at once over one connection pool.
+
+    Args:
+        services (list[Services]): Services objects to pull.
+        all_pages (bool, optional): Follow nextLink until the last page instead of pulling only the first one. Defaults to False.
+
+    Returns:
+        list[Services]: The same objects, pulled, in the same order.
+    """
+
+    async def gather() -> list[Services]:
+        async with aiohttp.ClientSession(
+            # Bulkhead, caps in-flight queries so a wide fan-out does not earn a
+            # wall of 429s. The sync `pull` sends one request at a time.
+            connector=aiohttp.TCPConnector(limit=AZURE_CM_BULKHEAD),
+            timeout=aiohttp.ClientTimeout(
+                sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT
+            ),
+        ) as session:
+            return await asyncio.gather(
+                *(
+                    (
+                        service.async_pull_all(session=session)
+                        if all_pages
+                        else service.async_pull(session=session)
+                    )
+                    for service in services
+                )
+            )
+
+    return asyncio.run(gather())
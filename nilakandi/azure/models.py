@@ -1,29 +1,35 @@
-from typing import Any, Dict, List, Optional, TypeVar, Union
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
 
 import pandas as pd
-from pydantic import BaseModel
 
-PandasDataFrame = TypeVar("pandas.core.frame.DataFrame")
 
-
-class ApiResult(BaseModel):
-    """ApiResult is a Pydantic model that represents the result of an API call.
+@dataclass(slots=True)
+class ApiResult:
+    """ApiResult is a plain dataclass that represents the result of an API call.
+    The response is already trusted, so nothing is validated on construction.
 
     Attributes:
         status (int): The HTTP status code of the API response.
         headers (Dict[str, str]): The headers returned in the API response.
         meta (Dict[str, str | None]): Metadata associated with the API response.
         next_link (Optional[str]): The URL for the next set of results, if available.
-        raw (List[Dict[str, Any]]): The raw data returned by the API.
-        data (PandasDataFrame): A pandas DataFrame representation of the raw data.
+        raw (List[Dict[str, Any]] | List[List[Any]]): The raw data returned by the API, rows may be positional.
+        columns (Optional[List[str]]): Column names of positional rows in raw, if any.
+        data (pd.DataFrame): A pandas DataFrame of the raw data, built on access.
     """
 
     status: int
     headers: Dict[str, str]
     meta: Optional[Dict[str, str | None]] = None
     next_link: Optional[str] = None
-    raw: Optional[Union[List[Dict[str, Any]], Dict[str, Any]]] = None
-    data: PandasDataFrame = pd.DataFrame()
+    raw: Optional[Union[List[Dict[str, Any]], List[List[Any]], Dict[str, Any]]] = None
+    columns: Optional[List[str]] = None
+
+    @property
+    def data(self) -> pd.DataFrame:
+        """pandas DataFrame of the raw data, only built for callers that need it."""
+        return pd.DataFrame(data=self.raw, columns=self.columns)
 
     # def __init_subclass__(cls, **kwargs):
     #     cls._transform_data()
@@ -1,16 +1,33 @@
-from typing import Iterable
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from functools import cached_property, lru_cache
+from itertools import islice
+from operator import itemgetter
+from time import monotonic, time
+from typing import Iterable, Iterator
 import uuid
 import requests
+from requests.adapters import HTTPAdapter
 from pandas import DataFrame
-from re import sub
-from datetime import datetime as dt, timedelta, time
+from datetime import datetime as dt, timedelta
 from zoneinfo import ZoneInfo
 
+from azure.core.credentials import AccessToken
+from azure.core.exceptions import HttpResponseError
+from azure.core.pipeline.transport import RequestsTransport
 from azure.identity import ClientSecretCredential
+from azure.identity.aio import ClientSecretCredential as AsyncClientSecretCredential
 from azure.mgmt.consumption import ConsumptionManagementClient
+from azure.mgmt.consumption.aio import (
+    ConsumptionManagementClient as AsyncConsumptionClient,
+)
 from azure.mgmt.costmanagement import CostManagementClient
+from azure.mgmt.costmanagement.aio import CostManagementClient as AsyncCostClient
 from azure.mgmt.subscription import SubscriptionClient
 from azure.mgmt.compute import ComputeManagementClient
+from azure.mgmt.compute.aio import ComputeManagementClient as AsyncComputeClient
 from azure.mgmt.consumption.operations import MarketplacesOperations
 from azure.mgmt.consumption.models import MarketplacesListResult
 from azure.mgmt.costmanagement.models import (
@@ -21,9 +38,19 @@ from azure.mgmt.costmanagement.models import (
     QueryTimePeriod,
     QueryResult,
 )
+from django.conf import settings
+from django.db import transaction
+from tenacity import retry, retry_if_exception, stop_after_attempt
 
 from config.django.base import TIME_ZONE
+from nilakandi.helper.bulk_copy import copy_insert
+from nilakandi.helper.miscellaneous import (
+    cached_subscription,
+    snake_case,
+    wait_retry_after,
+)
 from nilakandi.models import (
+    SERVICES_NATURAL_KEY,
     Subscription as SubscriptionsModel,
     Services as ServicesModel,
     Marketplace as MarketplacesModel,
@@ -31,6 +58,96 @@ from nilakandi.models import (
     Billing as BillingModel,
 )
 
+logger = logging.getLogger(__name__)
+
+# Subscription listings per (tenant id, client id), as (monotonic time fetched, items).
+SUBSCRIPTIONS_CACHE: dict[tuple[str, str], tuple[float, list[dict]]] = {}
+SUBSCRIPTIONS_CACHE_TTL = 300  # seconds
+
+# Cost Management groupings of the Services query. Every dimension multiplies
+# the rows returned, ResourceId most of all (one row per resource instead of
+# per service), so SERVICE_DIMENSIONS is the much smaller service rollup.
+SERVICE_DIMENSIONS: tuple[str, ...] = (
+    "SubscriptionId",
+    "ChargeType",
+    "ServiceName",
+    "ServiceTier",
+    "Meter",
+    "PartNumber",
+    "BillingMonth",
+)
+RESOURCE_DIMENSIONS: tuple[str, ...] = SERVICE_DIMENSIONS + (
+    "ResourceId",
+    "ResourceType",
+)
+
+# Marketplace fields copied as-is from the consumption API items, the renamed
+# and UUID fields (source_id, name, order_number) are handled in db_save.
+MARKETPLACE_FIELDS: tuple[str, ...] = (
+    "type",
+    "tags",
+    "billing_period_id",
+    "usage_start",
+    "usage_end",
+    "resource_rate",
+    "offer_name",
+    "resource_group",
+    "additional_info",
+    "instance_name",
+    "instance_id",
+    "currency",
+    "consumed_quantity",
+    "unit_of_measure",
+    "pretax_cost",
+    "is_estimated",
+    "meter_id",
+    "subscription_name",
+    "account_name",
+    "department_name",
+    "cost_center",
+    "publisher_name",
+    "plan_name",
+    "is_recurring_charge",
+)
+
+
+def is_transient(e: BaseException) -> bool:
+    """Whether a raw management API request is worth retrying.
+    SDK client calls are not wrapped, azure-core's RetryPolicy already retries
+    them on 429 and 5xx honoring Retry-After.
+
+    Args:
+        e (BaseException): Exception raised by requests.
+
+    Returns:
+        bool: True on throttling, a server error or a dropped connection.
+    """
+    if isinstance(e, requests.HTTPError):
+        return e.response.status_code in (429, 500, 502, 503, 504)
+    return isinstance(e, (requests.ConnectionError, requests.Timeout))
+
+
+@lru_cache(maxsize=32)
+def cached_credential(
+    tenant_id: str, client_id: str, client_secret: str
+) -> ClientSecretCredential:
+    """Credential memoized per process, so every Auth of the same API user
+    shares its in-memory token cache instead of asking Azure AD again.
+
+    Args:
+        tenant_id (str): Tenant Id
+        client_id (str): Id of API User
+        client_secret (str): Password for the API User
+
+    Returns:
+        ClientSecretCredential: Credential shared by every Auth with these arguments.
+    """
+    return ClientSecretCredential(
+        tenant_id=tenant_id,
+        client_id=client_id,
+        client_secret=client_secret,
+    )
+
 
 class Auth:
     """
@@ -48,12 +165,58 @@ class Auth:
         self.client_id = client_id
         self.tenant_id = tenant_id
         self.client_secret = client_secret
-        self.credential: ClientSecretCredential = ClientSecretCredential(
+        self.credential: ClientSecretCredential = cached_credential(
+            tenant_id=self.tenant_id,
+            client_id=self.client_id,
+            client_secret=self.client_secret,
+        )
+        self._token: AccessToken | None = None
+
+    @property
+    def token(self) -> AccessToken:
+        """Management API token, fetched on first use and refreshed shortly before it expires.
+
+        Returns:
+            AccessToken: Token for https://management.azure.com.
+        """
+        if self._token is None or self._token.expires_on - time() < 60:
+            self._token = self.credential.get_token(
+                "https://management.azure.com/.default"
+            )
+        return self._token
+
+    @cached_property
+    def session(self) -> requests.Session:
+        """Keep-alive session shared by every request made with this Auth.
+
+        Returns:
+            requests.Session: Session with a connection pool mounted for https.
+        """
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=32))
+        return session
+
+    @cached_property
+    def transport(self) -> RequestsTransport:
+        """Azure SDK transport on top of `session`, so SDK clients share its pool.
+
+        Returns:
+            RequestsTransport: Transport to pass to the management clients.
+        """
+        return RequestsTransport(session=self.session, session_owner=False)
+
+    def async_credential(self) -> AsyncClientSecretCredential:
+        """New async credential for the aio SDK clients.
+        Async credentials are bound to the running event loop, so this is not cached.
+
+        Returns:
+            AsyncClientSecretCredential: Credential, to be used as an async context manager.
+        """
+        return AsyncClientSecretCredential(
             tenant_id=self.tenant_id,
             client_id=self.client_id,
             client_secret=self.client_secret,
         )
-        self.token = self.credential.get_token("https://management.azure.com/.default")
 
 
 class Services:
@@ -63,23 +226,67 @@ class Services:
         self,
         auth: Auth,
         subscription: SubscriptionsModel,
-        end_date: dt = dt.now(ZoneInfo(TIME_ZONE)),
+        end_date: dt | None = None,
         start_date: dt | None = None,
+        dimensions: tuple[str, ...] = RESOURCE_DIMENSIONS,
     ) -> None:
+        """Class Initializer
+
+        Args:
+            auth (Auth): Auth object
+            subscription (SubscriptionsModel): Subscription object
+            end_date (dt | None, optional): End date of data gathered. Defaults to now.
+            start_date (dt | None, optional): Start date of data gathered. Defaults to 7 days before end_date.
+            dimensions (tuple[str, ...], optional): Query groupings, each one multiplies the rows returned. Pass SERVICE_DIMENSIONS to skip the per-resource rows. Defaults to RESOURCE_DIMENSIONS.
+        """
         self.auth = auth
         self.subscription: SubscriptionsModel = subscription
+        end_date = end_date if end_date else dt.now(ZoneInfo(TIME_ZONE))
         self.startDate = start_date if start_date else end_date - timedelta(days=7)
         self.endDate = end_date
+        self.dimensions = dimensions
 
-    def get(self) -> "Services":
+    def get(self, scope: str | None = None) -> "Services":
         """Get from Azure API
 
+        Args:
+            scope (str | None, optional): Query scope. Defaults to the subscription.
+
         Returns:
             Services: Azure API Services object
         """
-        client = CostManagementClient(credential=self.auth.credential)
-        self.scope = self.subscription.id
-        self.query = QueryDefinition(
+        client = CostManagementClient(
+            credential=self.auth.credential, transport=self.auth.transport
+        )
+        self.scope = scope if scope else self.subscription.id
+        self.query = self._query()
+        self.clientale = client.query
+        return self._load(self.clientale.usage(scope=self.scope, parameters=self.query))
+
+    async def aget(self, credential: AsyncClientSecretCredential) -> "Services":
+        """Async counterpart of `get`, see `get_concurrently`.
+
+        Args:
+            credential (AsyncClientSecretCredential): Credential from Auth.async_credential.
+
+        Returns:
+            Services: Azure API Services object
+        """
+        async with AsyncCostClient(credential=credential) as client:
+            self.scope = self.subscription.id
+            self.query = self._query()
+            self.clientale = client.query
+            return self._load(
+                await self.clientale.usage(scope=self.scope, parameters=self.query)
+            )
+
+    def _query(self) -> QueryDefinition:
+        """Cost Management query for the configured date range.
+
+        Returns:
+            QueryDefinition: Query definition.
+        """
+        return QueryDefinition(
             type="ActualCost",
             timeframe="Custom",
             time_period=QueryTimePeriod(
@@ -92,38 +299,182 @@ class Services:
                     "totalCost": QueryAggregation(name="CostUSD", function="Sum")
                 },
                 grouping=[
-                    QueryGrouping(name="SubscriptionId", type="Dimension"),
-                    QueryGrouping(name="ChargeType", type="Dimension"),
-                    QueryGrouping(name="ServiceName", type="Dimension"),
-                    QueryGrouping(name="ServiceTier", type="Dimension"),
-                    QueryGrouping(name="Meter", type="Dimension"),
-                    QueryGrouping(name="PartNumber", type="Dimension"),
-                    QueryGrouping(name="BillingMonth", type="Dimension"),
-                    QueryGrouping(name="ResourceId", type="Dimension"),
-                    QueryGrouping(name="ResourceType", type="Dimension"),
-                    # QueryGrouping(name="VM Name", type="TagKey"),
+                    QueryGrouping(name=dimension, type="Dimension")
+                    for dimension in self.dimensions
                 ],
             ),
         )
-        self.clientale = client.query
-        self.queryRes: QueryResult = self.clientale.usage(
-            scope=self.scope, parameters=self.query
-        )
+
+    def _load(self, queryRes: QueryResult) -> "Services":
+        """Keep the rows of the query result as returned, see `as_dataframe`.
+
+        Args:
+            queryRes (QueryResult): Result of the usage query.
+
+        Returns:
+            Services: Azure API Services object
+        """
+        self.queryRes: QueryResult = queryRes
         self.nextLink: str = self.queryRes.next_link
-        self.res: DataFrame = DataFrame(
-            data=self.queryRes.rows,
-            columns=[
-                sub(
-                    r"(?<=[a-z])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])", "_", col.name
-                ).lower()
-                for col in self.queryRes.columns
-            ],
-        )
+        self.rows: list[list] = self.queryRes.rows
+        self.columns: list[str] = [snake_case(col.name) for col in queryRes.columns]
         return self
 
+    @property
+    def res(self) -> DataFrame:
+        """The pulled rows as a DataFrame, see `as_dataframe`."""
+        return self.as_dataframe()
+
+    def as_dataframe(self) -> DataFrame:
+        """Build a DataFrame of the pulled rows, only for callers that need one.
+
+        Returns:
+            DataFrame: One column per query column, snake_cased.
+        """
+        return DataFrame(data=self.rows, columns=self.columns)
+
     def next(self, next_uri: str | None = None) -> "Services":
         if (not self.nextLink) or (self.nextLink is None):
             raise ValueError("No next link")
+        next_res = self._next_page(uri=self.nextLink if not next_uri else next_uri)
+        self.nextLink: str = next_res["properties"]["nextLink"]
+        self.rows = next_res["properties"]["rows"]
+        self.columns = [
+            snake_case(col["name"]) for col in next_res["properties"]["columns"]
+        ]
+        # self.res['usage_date'] = to_datetime(self.res['usage_date'].astype(
+        #     str), format="%Y%m%d")
+        return self
+
+    def get_all(self, scope: str | None = None) -> "Services":
+        """Get every page, following nextLink, into a single list of rows.
+
+        Args:
+            scope (str | None, optional): Query scope. Defaults to the subscription.
+
+        Returns:
+            Services: Azure API Services object
+        """
+        self.get(scope=scope)
+        self.rows = list(self.rows)
+        while self.nextLink:
+            next_res = self._next_page(uri=self.nextLink)
+            self.rows.extend(next_res["properties"]["rows"])
+            self.nextLink = next_res["properties"]["nextLink"]
+        return self
+
+    def iter_pages(self, scope: str | None = None) -> Iterator["Services"]:
+        """Get page by page, the next page is fetched while the caller handles the current one.
+        A nextLink only comes with its page, so one page ahead is as far as it can prefetch.
+
+        Args:
+            scope (str | None, optional): Query scope. Defaults to the subscription.
+
+        Yields:
+            Services: This object, holding the rows of one page at a time.
+        """
+        self.get(scope=scope)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            while True:
+                pending = (
+                    executor.submit(self._next_page, self.nextLink)
+                    if self.nextLink
+                    else None
+                )
+                yield self
+                if pending is None:
+                    return
+                next_res = pending.result()
+                self.nextLink = next_res["properties"]["nextLink"]
+                self.rows = next_res["properties"]["rows"]
+                self.columns = [
+                    snake_case(col["name"]) for col in next_res["properties"]["columns"]
+                ]
+
+    @classmethod
+    def get_many(
+        cls,
+        auth: Auth,
+        subscriptions: list[SubscriptionsModel],
+        end_date: dt,
+        start_date: dt | None = None,
+        management_group: str | None = None,
+        max_workers: int = 8,
+        dimensions: tuple[str, ...] = RESOURCE_DIMENSIONS,
+    ) -> list["Services"]:
+        """Get all pages for many subscriptions.
+        With a management group the whole set is one query, split per subscription
+        afterwards. Without one, or if that query is refused, the per-subscription
+        queries run on a thread pool over the shared session.
+
+        Args:
+            auth (Auth): Auth object
+            subscriptions (list[SubscriptionsModel]): Subscriptions to get.
+            end_date (dt): End date of data gathered.
+            start_date (dt | None, optional): Start date of data gathered. Defaults to 7 days before end_date.
+            management_group (str | None, optional): Management group holding every subscription. Defaults to None.
+            max_workers (int, optional): Concurrent queries of the fallback. Defaults to 8.
+            dimensions (tuple[str, ...], optional): Query groupings, see `__init__`. Defaults to RESOURCE_DIMENSIONS.
+
+        Returns:
+            list[Services]: One pulled Services object per subscription, in the same order.
+        """
+        services = [
+            cls(
+                auth=auth,
+                subscription=subscription,
+                end_date=end_date,
+                start_date=start_date,
+                dimensions=dimensions,
+            )
+            for subscription in subscriptions
+        ]
+        if not services:
+            return services
+        if management_group:
+            scope = (
+                f"/providers/Microsoft.Management/managementGroups/{management_group}"
+            )
+            try:
+                combined = services[0].get_all(scope=scope)
+            # The first page fails through the SDK, the following ones through requests.
+            except (HttpResponseError, requests.HTTPError) as e:
+                logger.warning(
+                    "Query of %s failed, falling back to one query per subscription: %s",
+                    scope,
+                    e,
+                )
+            else:
+                columns = combined.columns
+                at = columns.index("subscription_id")
+                split: dict[str, list[list]] = {}
+                for row in combined.rows:
+                    split.setdefault(str(row[at]).lower(), []).append(row)
+                for service in services:
+                    service.nextLink = None
+                    service.columns = columns
+                    service.rows = split.get(
+                        str(service.subscription.subscription_id).lower(), []
+                    )
+                return services
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(cls.get_all, services))
+
+    @retry(
+        stop=stop_after_attempt(5),
+        reraise=True,
+        wait=wait_retry_after,
+        retry=retry_if_exception(is_transient),
+    )
+    def _next_page(self, uri: str) -> dict:
+        """Post the query to a nextLink, retried on throttling and server errors.
+
+        Args:
+            uri (str): nextLink of the previous page.
+
+        Returns:
+            dict: Decoded response body.
+        """
         payload = {
             "type": "ActualCost",
             "timeframe": "Custom",
@@ -134,8 +485,8 @@ class Services:
             "dataset": self.query.dataset.as_dict(),
         }
         try:
-            apiRes = requests.post(
-                url=self.nextLink if not next_uri else next_uri,
+            apiRes = self.auth.session.post(
+                url=uri,
                 headers={
                     "Authorization": f"Bearer {self.auth.token.token}",
                     "Content-Type": "application/json",
@@ -148,26 +499,14 @@ class Services:
             apiRes.raise_for_status()
         except requests.HTTPError as e:
             raise e
-        next_res = apiRes.json()
-        self.nextLink: str = next_res["properties"]["nextLink"]
-        self.res: DataFrame = DataFrame(
-            next_res["properties"]["rows"],
-            columns=[
-                sub(
-                    r"(?<=[a-z])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])", "_", col["name"]
-                ).lower()
-                for col in next_res["properties"]["columns"]
-            ],
-        )
-        # self.res['usage_date'] = to_datetime(self.res['usage_date'].astype(
-        #     str), format="%Y%m%d")
-        return self
+        return apiRes.json()
 
     def db_save(
         self,
         ignore_conflicts: bool = False,
         update_conflicts: bool = True,
         check_conflic_on_create: bool = True,
+        fast_path: bool = False,
     ) -> "Services":
         """Save data to DB
 
@@ -175,45 +514,108 @@ class Services:
             ignore_conflicts (bool, optional): Should DB ignore conficted data. Defaults to False.
             update_conflicts (bool, optional): Should DB update conflicted data. Defaults to True.
             check_conflic_on_create (bool, optional): If data confilcting should it be updated. Defaults to True.
+            fast_path (bool, optional): Load with PostgreSQL COPY instead of INSERT batches, for large backfills. Defaults to False.
 
         Returns:
             Services: Azure API Services object
         """
-        if not isinstance(self.res, DataFrame) or self.res.empty:
-            print(f"Data: {self.res.head(5)}")
+        if not getattr(self, "rows", None):
             raise ValueError("No data to save")
+        at = {name: index for index, name in enumerate(self.columns)}
+        # Row values in model order, fetched with one C call per row.
+        get_fields = itemgetter(
+            at["usage_date"],
+            at["charge_type"],
+            at["service_name"],
+            at["service_tier"],
+            at["meter"],
+            at["part_number"],
+            at["billing_month"],
+            at["cost_usd"],
+            at["currency"],
+        )
+        # Absent when queried with SERVICE_DIMENSIONS, stored as "" then.
+        get_resource = (
+            itemgetter(at["resource_id"], at["resource_type"])
+            if "resource_id" in at
+            else lambda row: ("", "")
+        )
+        # Few distinct days and months per pull, parse each once.
+        usage_dates = {
+            value: dt.strptime(str(value), "%Y%m%d").date()
+            for value in {row[at["usage_date"]] for row in self.rows}
+        }
+        billing_months = {
+            value: dt.fromisoformat(value).date()
+            for value in {row[at["billing_month"]] for row in self.rows}
+        }
         data: list[ServicesModel] = [
             ServicesModel(
                 subscription=self.subscription,
-                usage_date=dt.strptime(str(row["usage_date"]), "%Y%m%d"),
-                charge_type=row["charge_type"],
-                service_name=row["service_name"],
-                service_tier=row["service_tier"],
-                meter=row["meter"],
-                part_number=row["part_number"],
-                billing_month=dt.fromisoformat(row["billing_month"]).date(),
-                resource_id=row["resource_id"],
-                resource_type=row["resource_type"],
-                cost_usd=row["cost_usd"],
-                currency=row["currency"],
+                usage_date=usage_dates[usage_date],
+                charge_type=charge_type,
+                service_name=service_name,
+                service_tier=service_tier,
+                meter=meter,
+                part_number=part_number,
+                billing_month=billing_months[billing_month],
+                resource_id=resource_id or "",
+                resource_type=resource_type or "",
+                cost_usd=cost_usd,
+                currency=currency,
+            )
+            for (
+                usage_date,
+                charge_type,
+                service_name,
+                service_tier,
+                meter,
+                part_number,
+                billing_month,
+                cost_usd,
+                currency,
+            ), (resource_id, resource_type) in zip(
+                map(get_fields, self.rows), map(get_resource, self.rows)
             )
-            for index, row in self.res.iterrows()
         ]
-        if check_conflic_on_create:
-            ServicesModel.objects.bulk_create(
-                data,
-                batch_size=500,
-                ignore_conflicts=ignore_conflicts,
-                update_conflicts=update_conflicts,
-                unique_fields=["usage_date", "service_name", "service_tier", "meter"],
-                update_fields=["charge_type", "part_number", "cost_usd", "currency"],
+        if fast_path:
+            conflicts = (
+                dict(
+                    ignore_conflicts=ignore_conflicts,
+                    update_conflicts=update_conflicts,
+                    unique_fields=SERVICES_NATURAL_KEY,
+                    update_fields=["cost_usd", "currency"],
+                )
+                if check_conflic_on_create
+                else {}
             )
-        else:
-            ServicesModel.objects.bulk_create(data, batch_size=500)
+            copy_insert(ServicesModel, data, **conflicts)
+            return self
+        with transaction.atomic():
+            if check_conflic_on_create:
+                ServicesModel.objects.bulk_create(
+                    data,
+                    batch_size=settings.SERVICES_BULK_BATCH_SIZE,
+                    ignore_conflicts=ignore_conflicts,
+                    update_conflicts=update_conflicts,
+                    unique_fields=SERVICES_NATURAL_KEY,
+                    update_fields=["cost_usd", "currency"],
+                )
+            else:
+                ServicesModel.objects.bulk_create(
+                    data, batch_size=settings.SERVICES_BULK_BATCH_SIZE
+                )
         return self
 
-    def __dict__(self) -> dict:
-        return self.res.as_dict() if self.res else {}
+    def to_dict(self) -> list[dict]:
+        """The pulled rows as records, one dict per row.
+
+        Returns:
+            list[dict]: Rows keyed by snake_cased column, empty before a pull.
+        """
+        if not getattr(self, "rows", None):
+            return []
+        return self.as_dataframe().to_dict(orient="records")
 
 
 class Subscriptions:
@@ -231,12 +633,55 @@ class Subscriptions:
 
     def get(self) -> "Subscriptions":
         """Get Data from Azure API
+        The listing is cached per tenant and client id for SUBSCRIPTIONS_CACHE_TTL seconds.
 
         Returns:
             Subscriptions: Azure Api Subscriptions object
         """
-        client = SubscriptionClient(credential=self.auth.credential)
+        cached = SUBSCRIPTIONS_CACHE.get(self.cache_key)
+        if cached and monotonic() - cached[0] < SUBSCRIPTIONS_CACHE_TTL:
+            # Copied both ways, callers may change res without touching the cache.
+            self.res = deepcopy(cached[1])
+            return self
+        client = SubscriptionClient(
+            credential=self.auth.credential, transport=self.auth.transport
+        )
         self.res = [item.as_dict() for item in client.subscriptions.list()]
+        SUBSCRIPTIONS_CACHE[self.cache_key] = (monotonic(), deepcopy(self.res))
+        return self
+
+    @property
+    def cache_key(self) -> tuple[str, str]:
+        """Key of this listing in SUBSCRIPTIONS_CACHE, one app registration can serve several tenants.
+
+        Returns:
+            tuple[str, str]: Tenant id and client id.
+        """
+        return (self.auth.tenant_id, self.auth.client_id)
+
+    def get_one(self, subscription_id: str) -> "Subscriptions":
+        """Get a single subscription with a direct GET instead of listing all of them.
+
+        Args:
+            subscription_id (str): Subscription ID.
+
+        Returns:
+            Subscriptions: Azure Api Subscriptions object, res holds the one subscription.
+        """
+        client = SubscriptionClient(
+            credential=self.auth.credential, transport=self.auth.transport
+        )
+        item = client.subscriptions.get(subscription_id=subscription_id)
+        self.res = [item.as_dict()]
+        return self
+
+    def invalidate(self) -> "Subscriptions":
+        """Drop the cached listing of this tenant and client id, the next get lists again.
+
+        Returns:
+            Subscriptions: Azure Api Subscriptions object
+        """
+        SUBSCRIPTIONS_CACHE.pop(self.cache_key, None)
         return self
 
     def db_save(self) -> "Subscriptions":
@@ -250,10 +695,21 @@ class Subscriptions:
         """
         if not self.res or self.res is None or len(self.res) == 0:
             raise ValueError("No data to save")
-        for item in self.res:
-            SubscriptionsModel.objects.update_or_create(
-                subscription_id=item["subscription_id"], defaults=item
+        # Only overwrite what Azure returned, like update_or_create(defaults=item) did.
+        updateFields = {key for item in self.res for key in item} - {
+            "subscription_id",
+            "id",
+        }
+        with transaction.atomic():
+            SubscriptionsModel.objects.bulk_create(
+                [SubscriptionsModel(**item) for item in self.res],
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=["subscription_id"],
+                update_fields=[*updateFields, "last_edited"],
             )
+        # bulk_create sends no post_save, so nilakandi.signals does not clear it.
+        cached_subscription.cache_clear()
         return self
 
 
@@ -266,10 +722,11 @@ class Marketplaces:
         self,
         auth: Auth,
         subscription: SubscriptionsModel,
-        date: dt = dt.now(ZoneInfo(TIME_ZONE)),
+        date: dt | None = None,
     ) -> None:
         self.auth: Auth = auth
         self.subscription: SubscriptionsModel = subscription
+        date = date if date else dt.now(ZoneInfo(TIME_ZONE))
         self.yearMonth: str = date.strftime("%Y%m")
 
     def get(self) -> "Marketplaces":
@@ -281,13 +738,41 @@ class Marketplaces:
         client: ConsumptionManagementClient = ConsumptionManagementClient(
             credential=self.auth.credential,
             subscription_id=self.subscription.subscription_id,
+            transport=self.auth.transport,
         )
         self.clientale: MarketplacesOperations = client.marketplaces
         self.res: Iterable[MarketplacesListResult] = self.clientale.list(
-            scope=f"/subscriptions/{self.subscription.subscription_id}/providers/Microsoft.Billing/billingPeriods/{self.yearMonth}"
+            scope=self._scope()
         )
         return self
 
+    async def aget(self, credential: AsyncClientSecretCredential) -> "Marketplaces":
+        """Async counterpart of `get`, see `get_concurrently`.
+        Items are collected before the client closes, unlike the lazy pages of `get`.
+
+        Args:
+            credential (AsyncClientSecretCredential): Credential from Auth.async_credential.
+
+        Returns:
+            Marketplaces: Azure API Marketplaces object
+        """
+        async with AsyncConsumptionClient(
+            credential=credential,
+            subscription_id=self.subscription.subscription_id,
+        ) as client:
+            self.res = [
+                item async for item in client.marketplaces.list(scope=self._scope())
+            ]
+        return self
+
+    def _scope(self) -> str:
+        """Billing period scope of the subscription.
+
+        Returns:
+            str: Scope for the marketplaces list call.
+        """
+        return f"/subscriptions/{self.subscription.subscription_id}/providers/Microsoft.Billing/billingPeriods/{self.yearMonth}"
+
     def db_save(
         self,
         ignore_conflicts: bool = False,
@@ -311,7 +796,7 @@ class Marketplaces:
             except ValueError:
                 return None
 
-        if self.res is None or not self.res:
+        if self.res is None:
             raise ValueError("No data to save")
         # This is not best practice but it works and I am lazy
         uniqueFields = [
@@ -321,61 +806,41 @@ class Marketplaces:
             "publisher_name",
             "plan_name",
         ]
-        data: list[MarketplacesModel] = []
-        for item in self.res:
-            raw = item.as_dict() if hasattr(item, "as_dict") else vars(item)
-            data.append(
-                MarketplacesModel(
-                    subscription=self.subscription,
-                    source_id=get_uuid(value=raw.get("name")),
-                    name=raw.get("id"),
-                    type=raw.get("type"),
-                    tags=raw.get("tags"),
-                    billing_period_id=raw.get("billing_period_id"),
-                    usage_start=raw.get("usage_start"),
-                    usage_end=raw.get("usage_end"),
-                    resource_rate=raw.get("resource_rate"),
-                    offer_name=raw.get("offer_name"),
-                    resource_group=raw.get("resource_group"),
-                    additional_info=raw.get("additional_info"),
-                    order_number=get_uuid(value=raw.get("order_number")),
-                    instance_name=raw.get("instance_name"),
-                    instance_id=raw.get("instance_id"),
-                    currency=raw.get("currency"),
-                    consumed_quantity=raw.get("consumed_quantity"),
-                    unit_of_measure=raw.get("unit_of_measure"),
-                    pretax_cost=raw.get("pretax_cost"),
-                    is_estimated=raw.get("is_estimated"),
-                    meter_id=raw.get("meter_id"),
-                    subscription_name=raw.get("subscription_name"),
-                    account_name=raw.get("account_name"),
-                    department_name=raw.get("department_name"),
-                    cost_center=raw.get("cost_center"),
-                    publisher_name=raw.get("publisher_name"),
-                    plan_name=raw.get("plan_name"),
-                    is_recurring_charge=raw.get("is_recurring_charge"),
-                )
-            )
+        conflicts = dict(
+            ignore_conflicts=ignore_conflicts, update_conflicts=update_conflicts
+        )
         if check_conflic_on_create:
-            MarketplacesModel.objects.bulk_create(
-                data,
-                batch_size=500,
-                ignore_conflicts=ignore_conflicts,
-                update_conflicts=update_conflicts,
+            conflicts.update(
                 unique_fields=uniqueFields,
                 update_fields=[
-                    col
-                    for col in MarketplacesModel._meta.get_fields()
-                    if col.name not in uniqueFields
+                    field.name
+                    for field in MarketplacesModel._meta.concrete_fields
+                    if field.name not in ("id", "added", *uniqueFields)
                 ],
             )
-        else:
-            MarketplacesModel.objects.bulk_create(
-                data,
-                batch_size=500,
-                ignore_conflicts=ignore_conflicts,
-                update_conflicts=update_conflicts,
+        # Built lazily off the SDK pages, one 500 row batch in memory at a time.
+        models = (
+            MarketplacesModel(
+                subscription=self.subscription,
+                source_id=get_uuid(value=raw.get("name")),
+                name=raw.get("id"),
+                order_number=get_uuid(value=raw.get("order_number")),
+                **{field: raw.get(field) for field in MARKETPLACE_FIELDS},
+            )
+            for raw in (
+                item.as_dict() if hasattr(item, "as_dict") else vars(item)
+                for item in self.res
             )
+        )
+        saved = 0
+        # Pages are fetched by islice between batches, so each batch commits on
+        # its own instead of holding a transaction open for the whole listing.
+        while batch := list(islice(models, 500)):
+            with transaction.atomic():
+                MarketplacesModel.objects.bulk_create(batch, **conflicts)
+            saved += len(batch)
+        if not saved:
+            raise ValueError("No data to save")
         return self
 
 
@@ -384,7 +849,7 @@ class Billing:
         self,
         auth: Auth,
         subscription: SubscriptionsModel,
-        end_date: dt = dt.now(ZoneInfo(TIME_ZONE)),
+        end_date: dt | None = None,
         start_date: dt | None = None,
     ) -> None:
         """Class Initializer
@@ -395,6 +860,7 @@ class Billing:
         """
         self.auth = auth
         self.subscription: SubscriptionsModel = subscription
+        end_date = end_date if end_date else dt.now(ZoneInfo(TIME_ZONE))
         self.startDate = start_date if start_date else end_date - timedelta(days=7)
         self.endDate = end_date
 
@@ -407,8 +873,39 @@ class Billing:
         client: CostManagementClient = CostManagementClient(
             credential=self.auth.credential,
             subscription_id=self.subscription.subscription_id,
+            transport=self.auth.transport,
         )
 
+        query_result = client.query.usage(
+            scope=f"/subscriptions/{self.subscription.subscription_id}/",
+            parameters=self._query(),
+        )
+
+        return self._load(query_result)
+
+    async def aget(self, credential: AsyncClientSecretCredential) -> "Billing":
+        """Async counterpart of `get`, see `get_concurrently`.
+
+        Args:
+            credential (AsyncClientSecretCredential): Credential from Auth.async_credential.
+
+        Returns:
+            Billing: Azure API Billing object
+        """
+        async with AsyncCostClient(credential=credential) as client:
+            query_result = await client.query.usage(
+                scope=f"/subscriptions/{self.subscription.subscription_id}/",
+                parameters=self._query(),
+            )
+
+        return self._load(query_result)
+
+    def _query(self) -> QueryDefinition:
+        """Usage query for the configured date range.
+
+        Returns:
+            QueryDefinition: Query definition.
+        """
         required_columns = [
             "BillingMonth",
             "ResourceId",
@@ -443,18 +940,22 @@ class Billing:
             ],
         )
 
-        query_parameters = QueryDefinition(
+        return QueryDefinition(
             timeframe="Custom",
             time_period=time_period,
             dataset=dataset,
             type="Usage",
         )
 
-        query_result = client.query.usage(
-            scope=f"/subscriptions/{self.subscription.subscription_id}/",
-            parameters=query_parameters,
-        )
+    def _load(self, query_result: QueryResult) -> "Billing":
+        """Keep the query result as a DataFrame.
+
+        Args:
+            query_result (QueryResult): Result of the usage query.
 
+        Returns:
+            Billing: Azure API Billing object
+        """
         query_result_columns = [column.name for column in query_result.columns]
 
         self.res: DataFrame = DataFrame(
@@ -490,14 +991,80 @@ class VirtualMachines:
         client: ComputeManagementClient = ComputeManagementClient(
             credential=self.auth.credential,
             subscription_id=self.subscription.subscription_id,
+            transport=self.auth.transport,
         )
 
-        self.res = [item.as_dict() for item in client.virtual_machines.list_all()]
+        # Left as the ItemPaged iterator, db_save pulls pages as it writes.
+        self.res = client.virtual_machines.list_all()
+
+        return self
+
+    async def aget(self, credential: AsyncClientSecretCredential) -> "VirtualMachines":
+        """Async counterpart of `get`, see `get_concurrently`.
+
+        Args:
+            credential (AsyncClientSecretCredential): Credential from Auth.async_credential.
+
+        Returns:
+            VirtualMachines: Azure API VirtualMachines object
+        """
+        async with AsyncComputeClient(
+            credential=credential,
+            subscription_id=self.subscription.subscription_id,
+        ) as client:
+            self.res = [
+                item.as_dict() async for item in client.virtual_machines.list_all()
+            ]
 
         return self
 
+    def _iter_models(self) -> Iterable[VirtualMachineModel]:
+        """Build VirtualMachine models from self.res one item at a time.
+
+        Yields:
+            VirtualMachineModel: Unsaved VirtualMachine model
+        """
+        subs_id = self.subscription.subscription_id
+        for item in self.res:
+            # get yields SDK models, aget already converted them to dicts
+            if hasattr(item, "as_dict"):
+                item = item.as_dict()
+            # vm_id is the upsert key, a VM without one cannot be matched.
+            if not item.get("vm_id"):
+                continue
+            # fromisoformat reads both "...:SS.ffffffZ" and "...:SSZ" since 3.11.
+            time_created_str = item.get("time_created")
+            time_created_obj = (
+                dt.fromisoformat(time_created_str).time() if time_created_str else None
+            )
+
+            yield VirtualMachineModel(
+                subscription=self.subscription,
+                vm_subs_id=subs_id,
+                vm_id=item.get("vm_id"),
+                name=item.get("name"),
+                type=item.get("type"),
+                location=item.get("location"),
+                tags=item.get("tags", {}),
+                resources=item.get("resources", {}),
+                identity=item.get("identity", {}),
+                zones=item.get("zones", []),
+                etag=item.get("etag"),
+                hardware_profile=item.get("hardware_profile", {}),
+                storage_profile=item.get("storage_profile", {}),
+                os_profile=item.get("os_profile", {}),
+                network_profile=item.get("network_profile", {}),
+                diagnostic_profile=item.get("diagnostic_profile", {}),
+                provisioning_state=item.get("provisioning_state"),
+                license_type=item.get("license_type"),
+                time_created=time_created_obj,
+                security_profile=item.get("security_profile", {}),
+                additional_capabilities=item.get("additional_capabilities", {}),
+                plan=item.get("plan", {}),
+            )
+
     def db_save(self):
-        """Save Data to DB
+        """Save Data to DB, 500 rows per insert while self.res is still paging.
 
         Raises:
             ValueError: self.res is None or empty
@@ -505,56 +1072,58 @@ class VirtualMachines:
         Returns:
             VirtualMachine: create or update existing data from DB
         """
-        if not self.res or self.res is None or len(self.res) == 0:
+        if self.res is None:
             raise ValueError("No data to save")
-        for item in self.res:
+        updateFields = [
+            field.name
+            for field in VirtualMachineModel._meta.concrete_fields
+            if field.name not in ("id", "subscription", "vm_id", "added")
+        ]
+        models = self._iter_models()
+        saved = 0
+        # Pages are fetched by islice between batches, so each batch commits on
+        # its own instead of holding a transaction open for the whole listing.
+        while batch := list(islice(models, 500)):
+            with transaction.atomic():
+                VirtualMachineModel.objects.bulk_create(
+                    batch,
+                    update_conflicts=True,
+                    unique_fields=["subscription", "vm_id"],
+                    update_fields=updateFields,
+                )
+            saved += len(batch)
+        if not saved:
+            raise ValueError("No data to save")
+        return self
 
-            time_created_str = item.get("time_created")
-            time_created_obj = None
 
-            subs_id = self.subscription.subscription_id
+def get_concurrently(
+    auth: Auth,
+    objs: Iterable[Services | Marketplaces | Billing | VirtualMachines],
+    limit: int = 8,
+) -> list[Services | Marketplaces | Billing | VirtualMachines | BaseException]:
+    """Run `aget` of many API objects at once, e.g. one per subscription.
+    Saving stays synchronous, call db_save on the results afterwards.
 
-            try:
-                dt_obj = dt.strptime(time_created_str, "%Y-%m-%dT%H:%M:%S.%fZ")
-                time_created_obj = time(
-                    dt_obj.hour, dt_obj.minute, dt_obj.second, dt_obj.microsecond
-                )
-            except ValueError:
-                dt_obj = dt.strptime(time_created_str, "%Y-%m-%dT%H:%M:%SZ")
-                time_created_obj = time(dt_obj.hour, dt_obj.minute, dt_obj.second)
+    Args:
+        auth (Auth): Auth object the async credential is made from.
+        objs (Iterable[Services | Marketplaces | Billing | VirtualMachines]): Objects to get, e.g. one per subscription.
+        limit (int, optional): Max requests in flight, ARM throttles per tenant. Defaults to 8.
 
-                continue
+    Returns:
+        list[Services | Marketplaces | Billing | VirtualMachines | BaseException]: The objects in the same order, or the exception their aget raised.
+    """
 
-            new_uuid = uuid.uuid4()
-            
-            VirtualMachineModel.objects.update_or_create(
-                id = new_uuid,
-                subscription_id=subs_id,
-                defaults={
-                    "vm_subs_id": subs_id,
-                    "name": item.get("name"),
-                    "type": item.get("type"),
-                    "location": item.get("location"),
-                    "tags": item.get(
-                        "tags", {}
-                    ),
-                    "resources": item.get("resources", {}),
-                    "identity": item.get("identity", {}),
-                    "zones": item.get("zones", []),
-                    "etag": item.get("etag"),
-                    "hardware_profile": item.get("hardware_profile", {}),
-                    "storage_profile": item.get("storage_profile", {}),
-                    "os_profile": item.get("os_profile", {}),
-                    "network_profile": item.get("network_profile", {}),
-                    "diagnostic_profile": item.get(
-                        "diagnostic_profile", {}
-                    ),
-                    "provisioning_state": item.get("provisioning_state"),
-                    "license_type": item.get("license_type"),
-                    "time_created": time_created_obj,
-                    "security_profile": item.get("security_profile", {}),
-                    "additional_capabilities": item.get("additional_capabilities", {}),
-                    "plan": item.get("plan", {}),
-                },
+    async def gather() -> list:
+        semaphore = asyncio.Semaphore(limit)
+        async with auth.async_credential() as credential:
+
+            async def bounded(obj):
+                async with semaphore:
+                    return await obj.aget(credential=credential)
+
+            return await asyncio.gather(
+                *(bounded(obj) for obj in objs), return_exceptions=True
             )
-        return self
\ No newline at end of file
+
+    return asyncio.run(gather())
@@ -0,0 +1,165 @@
+from itertools import chain
+from typing import Any, Iterable, Iterator
+
+from django.db import connections, router, transaction
+from django.db.models import Model
+
+# Characters read per chunk by copy_expert, only this much is buffered at once.
+COPY_CHUNK_SIZE = 64 * 1024
+
+# Characters that carry meaning in COPY's text format.
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def to_copy_text(value: Any) -> str:
+    """Render a database-prepared value as a COPY text format field.
+
+    Args:
+        value (Any): Value returned by Field.get_db_prep_save.
+
+    Returns:
+        str: Escaped field, "\\N" for NULL.
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    # psycopg2 Json adapters, returned for JSONField
+    if hasattr(value, "adapted") and hasattr(value, "dumps"):
+        value = value.dumps(value.adapted)
+    return str(value).translate(COPY_ESCAPES)
+
+
+class CopyStream:
+    """Read-only file over COPY text lines, built as copy_expert reads them."""
+
+    def __init__(self, lines: Iterator[str]) -> None:
+        """Class Initializer
+
+        Args:
+            lines (Iterator[str]): COPY text lines, each ending with a newline.
+        """
+        self.lines = lines
+        self.pending = ""
+        self.count = 0
+
+    def read(self, size: int = -1) -> str:
+        """Next chunk of COPY text, pulling just enough lines to fill it.
+
+        Args:
+            size (int, optional): Max characters to return, all that is left when negative. Defaults to -1.
+
+        Returns:
+            str: Chunk of COPY text, empty once every line has been read.
+        """
+        chunk = [self.pending]
+        length = len(self.pending)
+        while size < 0 or length < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            chunk.append(line)
+            length += len(line)
+            self.count += 1
+        text = "".join(chunk)
+        if size < 0:
+            self.pending = ""
+            return text
+        self.pending = text[size:]
+        return text[:size]
+
+
+def copy_insert(
+    model: type[Model],
+    objs: Iterable[Model],
+    ignore_conflicts: bool = False,
+    update_conflicts: bool = False,
+    unique_fields: list[str] | None = None,
+    update_fields: list[str] | None = None,
+) -> int:
+    """Insert unsaved model instances with PostgreSQL COPY.
+    One streamed COPY replaces the multi-row INSERT per batch of bulk_create.
+    Other database backends fall back to bulk_create.
+
+    Args:
+        model (type[Model]): Model class of the instances.
+        objs (Iterable[Model]): Instances to insert, consumed lazily.
+        ignore_conflicts (bool, optional): Skip rows violating a unique constraint, like bulk_create. Defaults to False.
+        update_conflicts (bool, optional): Update update_fields of rows conflicting on unique_fields, like bulk_create. Defaults to False.
+        unique_fields (list[str] | None, optional): Fields of the conflicting unique constraint. Defaults to None.
+        update_fields (list[str] | None, optional): Fields overwritten on conflict. Defaults to None.
+
+    Returns:
+        int: Number of instances sent to the database.
+
+    Raises:
+        ValueError: ignore_conflicts with update_conflicts, or update_conflicts without unique_fields and update_fields.
+    """
+    if ignore_conflicts and update_conflicts:
+        raise ValueError("ignore_conflicts and update_conflicts are mutually exclusive")
+    if update_conflicts and not (unique_fields and update_fields):
+        raise ValueError("update_conflicts needs unique_fields and update_fields")
+    using = router.db_for_write(model)
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        objs = list(objs)
+        model.objects.using(using).bulk_create(
+            objs,
+            batch_size=1000,
+            ignore_conflicts=ignore_conflicts,
+            update_conflicts=update_conflicts,
+            unique_fields=unique_fields,
+            update_fields=update_fields,
+        )
+        return len(objs)
+
+    quote = connection.ops.quote_name
+    fields = model._meta.concrete_fields
+    table = quote(model._meta.db_table)
+    columns = ", ".join(quote(field.column) for field in fields)
+    objs = iter(objs)
+    first = next(objs, None)
+    if first is None:
+        return 0
+
+    def lines() -> Iterator[str]:
+        for obj in chain((first,), objs):
+            # pre_save fills auto_now fields, as bulk_create would
+            values = (
+                field.get_db_prep_save(field.pre_save(obj, add=True), connection)
+                for field in fields
+            )
+            yield "\t".join(map(to_copy_text, values)) + "\n"
+
+    # Rows are rendered while COPY reads them, never held all at once.
+    stream = CopyStream(lines())
+
+    on_conflict = "ON CONFLICT DO NOTHING"
+    if update_conflicts:
+        unique = [quote(model._meta.get_field(name).column) for name in unique_fields]
+        update = [quote(model._meta.get_field(name).column) for name in update_fields]
+        on_conflict = "ON CONFLICT ({}) DO UPDATE SET {}".format(
+            ", ".join(unique),
+            ", ".join(f"{column} = EXCLUDED.{column}" for column in update),
+        )
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if not (ignore_conflicts or update_conflicts):
+            cursor.copy_expert(
+                f"COPY {table} ({columns}) FROM STDIN", stream, COPY_CHUNK_SIZE
+            )
+            return stream.count
+        # COPY cannot resolve conflicts, stage the rows and let INSERT resolve them.
+        staging = quote(f"{model._meta.db_table}_copy")
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {staging} (LIKE {table} INCLUDING DEFAULTS)"
+        )
+        cursor.copy_expert(
+            f"COPY {staging} ({columns}) FROM STDIN", stream, COPY_CHUNK_SIZE
+        )
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} "
+            f"{on_conflict}"
+        )
+        cursor.execute(f"DROP TABLE {staging}")
+    return stream.count
@@ -1,25 +1,53 @@
+import re
 from datetime import datetime as dt
 from datetime import timedelta
+from functools import lru_cache
+from uuid import UUID
 from zoneinfo import ZoneInfo
 
 from django.conf import settings
+from tenacity import wait_random_exponential
+
+from nilakandi.models import Subscription as SubscriptionsModel
+
+# Full jitter, used when Azure does not tell us how long to back off.
+wait_jitter = wait_random_exponential(multiplier=0.5, max=30)
+
+CAMEL_CASE_BOUNDARY = re.compile(r"(?<=[a-z])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])")
+
+
+@lru_cache(maxsize=256)
+def snake_case(name: str) -> str:
+    """Convert an Azure camelCase/PascalCase column name to snake_case.
+
+    Args:
+        name (str): Column name, e.g. "UsageDate" or "CostUSD".
+
+    Returns:
+        str: snake_case name, e.g. "usage_date" or "cost_usd".
+    """
+    return CAMEL_CASE_BOUNDARY.sub("_", name).lower()
 
 
 def wait_retry_after(retry_state):
     """Wait for the Retry-After time from the response headers.
+    Falls back to exponential backoff with full jitter when the header is
+    missing, so concurrent workers do not retry in lock-step.
 
     Args:
-        retry_state (Requests): Retry state object.
+        retry_state (RetryCallState): Retry state object.
 
     Returns:
-        int: time to wait in seconds.
+        float: time to wait in seconds.
     """
+    exc = retry_state.outcome.exception()
+    response = getattr(exc, "response", None)
+    # requests keeps headers on the response, aiohttp on the exception
+    headers = getattr(response, "headers", None) or getattr(exc, "headers", None)
     try:
-        response = retry_state.outcome.result()
-        if response is not None and "Retry-After" in response.headers:
-            return response.headers["Retry-After"]
-    except Exception:
-        return 20
+        return float(headers["Retry-After"])
+    except (KeyError, TypeError, ValueError):
+        return wait_jitter(retry_state)
 
 
 def yearly_list(start_date: dt, end_date: dt) -> list[tuple[dt, dt]]:
@@ -76,3 +104,31 @@ def yearly_list(start_date: dt, end_date: dt) -> list[tuple[dt, dt]]:
             )
         ]
     return dates
+
+
+@lru_cache(maxsize=1024)
+def cached_subscription(subscription_id: str) -> SubscriptionsModel:
+    """Subscription lookup memoized per process, cleared by nilakandi.signals.
+
+    Args:
+        subscription_id (str): Normalized subscription UUID string.
+
+    Returns:
+        SubscriptionsModel: Subscription object.
+    """
+    return SubscriptionsModel.objects.get(subscription_id=subscription_id)
+
+
+def get_subscription(subscription_id: UUID | str) -> SubscriptionsModel:
+    """Get a Subscription by id without a DB round-trip on repeated lookups.
+
+    Args:
+        subscription_id (UUID | str): Subscription ID.
+
+    Raises:
+        SubscriptionsModel.DoesNotExist: No subscription with the given id.
+
+    Returns:
+        SubscriptionsModel: Subscription object.
+    """
+    return cached_subscription(str(UUID(str(subscription_id))))
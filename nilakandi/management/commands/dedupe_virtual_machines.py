@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from nilakandi.models import VirtualMachine
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove VirtualMachine rows that would block the virtualmachine_vm_id "
+        "constraint, run before migrate."
+    )
+
+    def handle(self, *args, **options):
+        table = VirtualMachine._meta.db_table
+        if table not in connection.introspection.table_names():
+            self.stdout.write("No VirtualMachine table yet, nothing to dedupe.")
+            return
+
+        quote = connection.ops.quote_name
+        subscription = quote(VirtualMachine._meta.get_field("subscription").column)
+        vm_id, last_edited, pk = map(quote, ("vm_id", "last_edited", "id"))
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Rows without a vmId can never be upserted, a later pull adds them back.
+            cursor.execute(f"DELETE FROM {quote(table)} WHERE {vm_id} IS NULL")
+            nulls = cursor.rowcount
+            # Older saves inserted a new row per pull, keep the latest per VM.
+            cursor.execute(
+                f"DELETE FROM {quote(table)} a USING {quote(table)} b "
+                f"WHERE a.{subscription} = b.{subscription} AND a.{vm_id} = b.{vm_id} "
+                f"AND (a.{last_edited}, a.{pk}) < (b.{last_edited}, b.{pk})"
+            )
+            duplicates = cursor.rowcount
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Removed {nulls} rows without vm_id and {duplicates} duplicates."
+            )
+        )
@@ -1,3 +1,4 @@
+from celery import group
 from django.core.management.base import BaseCommand, no_translations
 from django.conf import settings
 
@@ -59,10 +60,13 @@ class Command(BaseCommand):
             "client_secret": str(settings.AZURE_CLIENT_SECRET),
         }
         subs = SubscriptionsModel.objects.all()
-        for sub in subs:
-            grab_services.delay(creds=creds, subscription_id=sub.subscription_id,
-                                start_date=startDate, end_date=endDate)
-            grab_marketplaces.delay(creds=creds, subscription_id=sub.subscription_id,
-                                    start_date=startDate, end_date=endDate)
+        # Tasks authenticate themselves from creds, a token taken here could
+        # expire while they wait in the queue.
+        group(
+            task.s(creds=creds, subscription_id=sub.subscription_id,
+                   start_date=startDate, end_date=endDate)
+            for sub in subs
+            for task in (grab_services, grab_marketplaces)
+        ).apply_async()
         self.stdout.write(self.style.SUCCESS(
             "Data gathering has been successfully queued."))
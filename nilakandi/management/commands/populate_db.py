@@ -1,9 +1,9 @@
 
 import sys
 from datetime import datetime as dt
-from time import sleep
 from zoneinfo import ZoneInfo
 
+from celery import group
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
 from django.core.management.base import BaseCommand
@@ -61,21 +61,25 @@ class Command(BaseCommand):
         # logger = logging.getLogger(__name__)
         # logger.info(f"{start_date=}, {end_date=}, Deltas = {end_date - start_date}")
 
-        auth = azure_api.Auth(
-            client_id=settings.AZURE_CLIENT_ID,
-            client_secret=settings.AZURE_CLIENT_SECRET,
-            tenant_id=settings.AZURE_TENANT_ID,
-        )
+        creds = {
+            "client_id": str(settings.AZURE_CLIENT_ID),
+            "tenant_id": str(settings.AZURE_TENANT_ID),
+            "client_secret": str(settings.AZURE_CLIENT_SECRET),
+        }
+        auth = azure_api.Auth(**creds)
         azure_api.Subscriptions(auth=auth).get().db_save()
 
         sys.stdout.write(
             f"{Subscription.objects.count()=} {", ".join(list(Subscription.objects.values_list('display_name', flat=True)))}\n"
         )
-        for sub in Subscription.objects.all():
-            grab_services.delay(
-                bearer=auth.token.token,
+        # Publish in one go, staggering start times instead of sleeping here.
+        group(
+            # Each task takes its own token when it runs, see grab_services.
+            grab_services.s(
+                creds=creds,
                 subscription_id=sub.subscription_id,
                 start_date=start_date,
                 end_date=end_date,
-            )
-            sleep(options["delay"])
+            ).set(countdown=index * options["delay"])
+            for index, sub in enumerate(Subscription.objects.all())
+        ).apply_async()
@@ -16,6 +16,22 @@ class Subscription(models.Model):
     last_edited = models.DateTimeField(auto_now=True)
     added = models.DateTimeField(auto_now=True, editable=False)
 
+
+# Dimensions the Services query groups by, one row per combination and day.
+SERVICES_NATURAL_KEY: list[str] = [
+    "subscription",
+    "usage_date",
+    "charge_type",
+    "service_name",
+    "service_tier",
+    "meter",
+    "part_number",
+    "billing_month",
+    "resource_id",
+    "resource_type",
+]
+
+
 class Services(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     subscription = models.ForeignKey(
@@ -31,13 +47,23 @@ class Services(models.Model):
     meter = models.CharField()
     part_number = models.CharField()
     billing_month = models.DateField()
-    resource_id = models.CharField(null=True)
-    resource_type = models.CharField(null=True)
+    # "" rather than NULL when absent, NULLs never conflict in a unique index.
+    resource_id = models.CharField(blank=True, default="")
+    resource_type = models.CharField(blank=True, default="")
     cost_usd = models.FloatField()
     currency = models.CharField()
     last_edited = models.DateTimeField(auto_now=True)
     added = models.DateTimeField(auto_now=True, editable=False)
 
+    class Meta:
+        constraints = [
+            # Lets ON CONFLICT skip re-pulled rows through an index lookup.
+            models.UniqueConstraint(
+                fields=SERVICES_NATURAL_KEY,
+                name="services_natural_key",
+            ),
+        ]
+
 
 class Operation(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -69,39 +95,23 @@ class Marketplace(models.Model):
         db_comment="Originally called name",
     )
     name = models.CharField(db_comment="Originally called id")
-    type = models.CharField()
-        default=uuid.uuid4,
-        editable=True,
-        null=True,
-        db_comment="Originally called name",
-    )
-    name = models.CharField(db_comment="Originally called id")
     type = models.CharField()
     tags = models.JSONField(null=True, default=dict, blank=True)
     billing_period_id = models.CharField()
-    billing_period_id = models.CharField()
     usage_start = models.DateTimeField()
     usage_end = models.DateTimeField()
     resource_rate = models.FloatField()
     offer_name = models.CharField()
     resource_group = models.CharField()
-    offer_name = models.CharField()
-    resource_group = models.CharField()
     additional_info = models.JSONField(null=True, default=dict, blank=True)
     order_number = models.UUIDField(
         default=uuid.uuid4, editable=True, null=True, blank=True
     )
     instance_name = models.CharField(null=True)
     instance_id = models.CharField(null=True)
-    currency = models.CharField(default="USD")
-        default=uuid.uuid4, editable=True, null=True, blank=True
-    )
-    instance_name = models.CharField(null=True)
-    instance_id = models.CharField(null=True)
     currency = models.CharField(default="USD")
     consumed_quantity = models.FloatField()
     unit_of_measure = models.CharField()
-    unit_of_measure = models.CharField()
     pretax_cost = models.FloatField()
     is_estimated = models.BooleanField()
     meter_id = models.CharField(null=True)
@@ -140,7 +150,7 @@ class VirtualMachine(models.Model):
     diagnostic_profile = models.JSONField(null=True, default=dict, blank=True)
     provisioning_state = models.CharField(null=True)
     license_type = models.CharField(null=True)
-    vm_id = models.CharField(null=True)
+    vm_id = models.CharField()
     time_created = models.TimeField(null=True)
     security_profile = models.JSONField(null=True, default=dict, blank=True)
     additional_capabilities = models.JSONField(null=True, default=dict, blank=True)
@@ -148,6 +158,14 @@ class VirtualMachine(models.Model):
     last_edited = models.DateTimeField(auto_now=True)
     added = models.DateTimeField(auto_now=True, editable=False)
 
+    class Meta:
+        constraints = [
+            # vmId is unique per VM, names only per resource group.
+            models.UniqueConstraint(
+                fields=["subscription", "vm_id"], name="virtualmachine_vm_id"
+            ),
+        ]
+
 
 class Billing(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -1,7 +1,11 @@
 import logging
 from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
+from nilakandi.helper.miscellaneous import cached_subscription
+from nilakandi.models import Subscription
+
 logger = logging.getLogger("django.db")
 
 
@@ -11,3 +15,8 @@ def log_db_connection(sender, connection, **kwargs):
     db_user = connection.settings_dict.get("USER", "Unknown User")
     logger.info(
         f"Database connection established: {db_name} as user {db_user}")
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+def clear_subscription_cache(sender, **kwargs):
+    cached_subscription.cache_clear()
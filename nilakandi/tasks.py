@@ -1,18 +1,23 @@
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from time import sleep
 from uuid import UUID
 
 from celery import shared_task
+from django.db import connections
 
-from nilakandi.azure.api.services import Services
+from nilakandi.azure.api.services import Services, pull_concurrently
 from nilakandi.helper import azure_api as azi
-from nilakandi.helper.miscellaneous import yearly_list
-from nilakandi.models import Subscription as SubscriptionsModel
+from nilakandi.helper.miscellaneous import get_subscription, yearly_list
 
 
-@shared_task(name="nilakandi.tasks.grab_services")
+@shared_task(
+    name="nilakandi.tasks.grab_services",
+    time_limit=30 * 60,  # 30 minutes
+    soft_time_limit=25 * 60,  # 25 minutes
+)
 def grab_services(
-    bearer: str,
+    creds: dict[str, str],
     subscription_id: UUID,
     start_date: datetime,
     end_date: datetime,
@@ -21,7 +26,7 @@ def grab_services(
     """Grab Services data from Azure API with the given parameters.
 
     Args:
-        bearer (str): Bearer token for the Azure API.
+        creds (dict[str, str]): Azure API credentials dictionary.
         subscription_id (UUID): Subscription ID.
         start_date (datetime): date to start the data gathering.
         end_date (datetime): date to end the data gathering.
@@ -32,27 +37,48 @@ def grab_services(
     """
     if skip_existing:
         raise NotImplementedError("skip_existing=True is not implemented yet.")
+    # Token taken when the task runs, not when it was queued, so a task that
+    # waited in the queue or was retried does not start with an expired one.
+    bearer = azi.Auth(**creds).token.token
     dates = yearly_list(start_date, end_date)
-    for date in dates:
-        start_date, end_date = date
-        services = (
+    # First page of every yearly window is fetched concurrently, the
+    # remaining pages depend on the previous nextLink so they stay serial.
+    pulled = pull_concurrently(
+        [
             Services(
                 bearer_token=bearer,
                 subscription=subscription_id,
-                start_date=start_date,
-                end_date=end_date,
+                start_date=start,
+                end_date=end,
             )
-            .pull()
-            .db_save()
-        )
-        # TODO: Implement Logging
-        while services.res.next_link:
-            nextUrl = services.res.next_link
-            services.pull(uri=nextUrl).db_save()
-            # TODO: Implement Logging
+            for start, end in dates
+        ]
+    )
+    # Pages are saved on a single background thread so the next page is
+    # already being pulled while the previous one is inserted.
+    saves: list[Future] = []
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        try:
+            for services in pulled:
+                saves.append(executor.submit(services.db_save, services.res))
+                # TODO: Implement Logging
+                while services.res.next_link:
+                    nextUrl = services.res.next_link
+                    services.pull(uri=nextUrl)
+                    saves.append(executor.submit(services.db_save, services.res))
+                    # TODO: Implement Logging
+        finally:
+            # Runs on the saving thread, closing its own DB connection.
+            executor.submit(connections.close_all)
+    for save in saves:
+        save.result()
 
 
-@shared_task(name="nilakandi.tasks.grab_marketplaces")
+@shared_task(
+    name="nilakandi.tasks.grab_marketplaces",
+    time_limit=30 * 60,  # 30 minutes
+    soft_time_limit=25 * 60,  # 25 minutes
+)
 def grab_marketplaces(
     creds: dict[str, str],
     subscription_id: UUID,
@@ -79,24 +105,13 @@ def grab_marketplaces(
         tenant_id=creds["tenant_id"],
         client_secret=creds["client_secret"],
     )
-    sub = SubscriptionsModel.objects.get(subscription_id=subscription_id)
+    sub = get_subscription(subscription_id=subscription_id)
     # earliest: datetime.date = sub.marketplace_set.earliest('usage_start').usage_start
     # latest: datetime.date = sub.marketplace_set.latest('usage_end').usage_end
-    loopedDate = start_date
-    while loopedDate <= end_date:
-        deltaDays: int = (
-            3 if (end_date - start_date).days >= 3 else (end_date - start_date).days
-        )
-        tempDate = loopedDate + timedelta(days=deltaDays)
-        marketplace = azi.Marketplaces(
-
-            auth=auth,
-            subscription=sub,
-            start_date=loopedDate,
-            end_date=tempDate,
-        )
-
-        marketplace.get().db_save()
+    # Marketplaces are listed per billing period, one request per month.
+    billingMonth = start_date.replace(day=1)
+    while billingMonth <= end_date:
+        azi.Marketplaces(auth=auth, subscription=sub, date=billingMonth).get().db_save()
         sleep(0.75)
-        loopedDate += timedelta(days=deltaDays + 1)
+        billingMonth = (billingMonth + timedelta(days=32)).replace(day=1)
 
@@ -1,3 +1,184 @@
-from django.test import TestCase
+import unittest
+import uuid
+from datetime import datetime as dt
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from psycopg2.extras import Json
+
+from nilakandi.azure.api.services import to_timestamp
+from nilakandi.helper.azure_api import is_transient
+from nilakandi.helper.bulk_copy import CopyStream, copy_insert, to_copy_text
+from nilakandi.helper.miscellaneous import snake_case, wait_retry_after
+from nilakandi.models import Subscription
+
+
+def make_subscription(**kwargs) -> Subscription:
+    subscription_id = kwargs.pop("subscription_id", uuid.uuid4())
+    return Subscription(
+        subscription_id=subscription_id,
+        id=f"/subscriptions/{subscription_id}",
+        display_name=kwargs.pop("display_name", "Nilakandi"),
+        state="Enabled",
+        authorization_source="RoleBased",
+        **kwargs,
+    )
+
+
+def http_error(status: int, headers: dict | None = None) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return requests.HTTPError(response=response)
+
+
+class ToCopyTextTest(SimpleTestCase):
+    def test_none_is_null_marker(self):
+        self.assertEqual(to_copy_text(None), "\\N")
+
+    def test_bools(self):
+        self.assertEqual(to_copy_text(True), "t")
+        self.assertEqual(to_copy_text(False), "f")
+
+    def test_escapes_delimiters(self):
+        self.assertEqual(to_copy_text("a\tb"), "a\\tb")
+        self.assertEqual(to_copy_text("a\nb\rc"), "a\\nb\\rc")
+        self.assertEqual(to_copy_text("a\\b"), "a\\\\b")
+
+    def test_backslash_escaped_before_tab(self):
+        self.assertEqual(to_copy_text("\\\t"), "\\\\\\t")
+
+    def test_json_adapter(self):
+        self.assertEqual(to_copy_text(Json({"a": 1})), '{"a": 1}')
+        self.assertEqual(to_copy_text(Json({"a": "b\\c"})), '{"a": "b\\\\\\\\c"}')
+
+    def test_other_values_use_str(self):
+        self.assertEqual(to_copy_text(1.5), "1.5")
+        value = uuid.uuid4()
+        self.assertEqual(to_copy_text(value), str(value))
+
+
+class CopyStreamTest(SimpleTestCase):
+    lines = [f"{index}\t{'x' * index}\n" for index in range(50)]
+
+    def test_reads_in_bounded_chunks(self):
+        stream = CopyStream(iter(self.lines))
+        chunks = []
+        while chunk := stream.read(7):
+            self.assertLessEqual(len(chunk), 7)
+            chunks.append(chunk)
+        self.assertEqual("".join(chunks), "".join(self.lines))
+        self.assertEqual(stream.count, 50)
+
+    def test_read_all(self):
+        stream = CopyStream(iter(self.lines))
+        self.assertEqual(stream.read(), "".join(self.lines))
+        self.assertEqual(stream.read(), "")
+
+
+class CopyInsertTest(TestCase):
+    def test_conflict_options_are_exclusive(self):
+        with self.assertRaises(ValueError):
+            copy_insert(
+                Subscription,
+                [make_subscription()],
+                ignore_conflicts=True,
+                update_conflicts=True,
+                unique_fields=["subscription_id"],
+                update_fields=["display_name"],
+            )
+
+    def test_update_conflicts_needs_fields(self):
+        with self.assertRaises(ValueError):
+            copy_insert(Subscription, [make_subscription()], update_conflicts=True)
+        with self.assertRaises(ValueError):
+            copy_insert(
+                Subscription,
+                [make_subscription()],
+                update_conflicts=True,
+                unique_fields=["subscription_id"],
+            )
+
+    def test_bulk_create_fallback(self):
+        objs = (make_subscription() for _ in range(3))
+        with mock.patch.object(connection, "vendor", "sqlite"), mock.patch(
+            "django.db.models.query.QuerySet.bulk_create"
+        ) as bulk_create:
+            self.assertEqual(copy_insert(Subscription, objs), 3)
+        bulk_create.assert_called_once()
+        (sent,) = bulk_create.call_args.args
+        self.assertEqual(len(sent), 3)
+        self.assertEqual(bulk_create.call_args.kwargs["batch_size"], 1000)
+        self.assertFalse(bulk_create.call_args.kwargs["update_conflicts"])
+
+    def test_empty_input(self):
+        self.assertEqual(copy_insert(Subscription, []), 0)
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "COPY is PostgreSQL only")
+    def test_copy_round_trip(self):
+        sub = make_subscription(
+            display_name="tab\there\nand \\ backslash",
+            subscription_policies={"quota": "a\tb"},
+        )
+        self.assertEqual(copy_insert(Subscription, [sub]), 1)
+        saved = Subscription.objects.get(subscription_id=sub.subscription_id)
+        self.assertEqual(saved.display_name, sub.display_name)
+        self.assertEqual(saved.subscription_policies, {"quota": "a\tb"})
+        self.assertEqual(saved.additional_properties, {})
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "COPY is PostgreSQL only")
+    def test_copy_conflicts(self):
+        subscription_id = uuid.uuid4()
+        copy_insert(Subscription, [make_subscription(subscription_id=subscription_id)])
+
+        renamed = make_subscription(subscription_id=subscription_id, display_name="b")
+        copy_insert(Subscription, [renamed], ignore_conflicts=True)
+        saved = Subscription.objects.get(subscription_id=subscription_id)
+        self.assertEqual(saved.display_name, "Nilakandi")
+
+        copy_insert(
+            Subscription,
+            [renamed],
+            update_conflicts=True,
+            unique_fields=["subscription_id"],
+            update_fields=["display_name"],
+        )
+        saved = Subscription.objects.get(subscription_id=subscription_id)
+        self.assertEqual(saved.display_name, "b")
+        self.assertEqual(Subscription.objects.count(), 1)
+
+
+class HelpersTest(SimpleTestCase):
+    def test_snake_case(self):
+        self.assertEqual(snake_case("UsageDate"), "usage_date")
+        self.assertEqual(snake_case("CostUSD"), "cost_usd")
+        self.assertEqual(snake_case("ResourceId"), "resource_id")
+
+    def test_to_timestamp(self):
+        self.assertEqual(
+            to_timestamp(dt(2024, 3, 15, 1, 2, 3)), "2024-03-15T01:02:03.000000Z"
+        )
+
+    def test_wait_retry_after_uses_header(self):
+        exc = http_error(429, {"Retry-After": "7"})
+        state = SimpleNamespace(
+            outcome=SimpleNamespace(exception=lambda: exc), attempt_number=1
+        )
+        self.assertEqual(wait_retry_after(state), 7.0)
+
+    def test_wait_retry_after_falls_back_to_jitter(self):
+        exc = http_error(429)
+        state = SimpleNamespace(
+            outcome=SimpleNamespace(exception=lambda: exc), attempt_number=3
+        )
+        self.assertTrue(0 <= wait_retry_after(state) <= 30)
+
+    def test_is_transient(self):
+        self.assertTrue(is_transient(http_error(429)))
+        self.assertTrue(is_transient(http_error(503)))
+        self.assertTrue(is_transient(requests.Timeout()))
+        self.assertFalse(is_transient(http_error(400)))
+        self.assertFalse(is_transient(ValueError()))